@@ -62,6 +62,28 @@ pub fn squared_euclidean_within(a: &[f64], b: &[f64], threshold: f64) -> bool {
     sum <= threshold
 }
 
+/// Dot product with four independent accumulators, so the loop
+/// auto-vectorizes instead of serializing on a single running sum.
+#[inline]
+pub fn dot(a: &[f64], b: &[f64]) -> f64 {
+    debug_assert_eq!(a.len(), b.len());
+    let mut acc = [0.0; 4];
+    let chunks_a = a.chunks_exact(4);
+    let chunks_b = b.chunks_exact(4);
+    let tail: f64 = chunks_a
+        .remainder()
+        .iter()
+        .zip(chunks_b.remainder())
+        .map(|(ai, bi)| ai * bi)
+        .sum();
+    for (ca, cb) in chunks_a.zip(chunks_b) {
+        for ((sum, x), y) in acc.iter_mut().zip(ca).zip(cb) {
+            *sum += x * y;
+        }
+    }
+    (acc[0] + acc[1]) + (acc[2] + acc[3]) + tail
+}
+
 #[inline]
 fn euclidean_distance(a: &[f64], b: &[f64]) -> f64 {
     squared_euclidean_distance(a, b).sqrt()
@@ -132,6 +154,14 @@ mod tests {
         assert!((minkowski_distance(&a, &a, 2.0)).abs() < 1e-10);
     }
 
+    #[test]
+    fn test_dot() {
+        let a = [1.0, 2.0, 3.0, 4.0, 5.0, 6.0];
+        let b = [6.0, 5.0, 4.0, 3.0, 2.0, 1.0];
+        assert!((dot(&a, &b) - 56.0).abs() < 1e-10);
+        assert!((dot(&a[..3], &b[..3]) - 28.0).abs() < 1e-10);
+    }
+
     #[test]
     fn test_squared_euclidean() {
         let a = [0.0, 0.0];
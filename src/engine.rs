@@ -1,7 +1,7 @@
 use crate::deleter;
 use crate::inserter;
 use crate::objects::Objects;
-use crate::types::{hash_coords, ClusterLabel};
+use crate::types::{hash_coords, ClusterLabel, ObjectId};
 
 pub struct IncrementalDbscan {
     objects: Objects,
@@ -14,17 +14,40 @@ impl IncrementalDbscan {
         }
     }
 
-    pub fn insert(&mut self, coords: &[f64]) {
-        inserter::insert(&mut self.objects, coords);
+    /// Insert a point and return its ObjectId, or None (nothing changed) if
+    /// its count or a neighbor's count would exceed u32::MAX.
+    pub fn insert(&mut self, coords: &[f64]) -> Option<ObjectId> {
+        inserter::insert(&mut self.objects, coords, 1)
+    }
+
+    /// Insert `weight` copies of a point in one step. Equivalent to calling
+    /// `insert` `weight` times, but with a single clustering update.
+    pub fn insert_weighted(&mut self, coords: &[f64], weight: u32) -> Option<ObjectId> {
+        inserter::insert(&mut self.objects, coords, weight)
     }
 
     pub fn delete(&mut self, coords: &[f64]) -> bool {
-        let obj_id = hash_coords(coords);
-        deleter::delete(&mut self.objects, obj_id)
+        self.delete_by_id(hash_coords(coords))
+    }
+
+    /// Delete one copy of the point with this ObjectId, skipping the
+    /// coordinate hash. Returns false if no such point exists.
+    pub fn delete_by_id(&mut self, id: ObjectId) -> bool {
+        deleter::delete(&mut self.objects, id)
     }
 
     pub fn get_label(&self, coords: &[f64]) -> Option<ClusterLabel> {
         let id = self.objects.get_object_id(coords)?;
         self.objects.get_label(id)
     }
+
+    /// Forget all points, keeping eps/min_pts/p and allocated capacity.
+    pub fn reset(&mut self) {
+        self.objects.clear();
+    }
+
+    /// Look up a label by ObjectId, skipping the coordinate hash.
+    pub fn get_label_by_id(&self, id: ObjectId) -> Option<ClusterLabel> {
+        self.objects.get_label(id)
+    }
 }
@@ -5,12 +5,14 @@ use crate::types::{
     ClusterLabel, ObjectId, CLUSTER_LABEL_NOISE, CLUSTER_LABEL_UNCLASSIFIED,
 };
 
-/// Insert a point and update clustering.
-/// Direct port of Python _inserter.py.
-pub fn insert(objects: &mut Objects, coords: &[f64]) {
-    let inserted_id = objects.insert_object(coords);
+/// Insert `weight` copies of a point and update clustering.
+/// Returns the ObjectId of the inserted point, or None (nothing changed) if
+/// a count would overflow u32.
+/// Direct port of Python _inserter.py (which always inserts with weight 1).
+pub fn insert(objects: &mut Objects, coords: &[f64], weight: u32) -> Option<ObjectId> {
+    let inserted_id = objects.insert_object(coords, weight)?;
 
-    let (new_cores, old_cores) = separate_core_neighbors_by_novelty(objects, inserted_id);
+    let (new_cores, old_cores) = separate_core_neighbors_by_novelty(objects, inserted_id, weight);
 
     if new_cores.is_empty() {
         // No new core objects: only the inserted object needs a label
@@ -26,7 +28,7 @@ pub fn insert(objects: &mut Objects, coords: &[f64]) {
             // Noise: no core neighbors at all
             objects.set_label(inserted_id, CLUSTER_LABEL_NOISE);
         }
-        return;
+        return Some(inserted_id);
     }
 
     let update_seeds = get_update_seeds(objects, &new_cores);
@@ -55,14 +57,18 @@ pub fn insert(objects: &mut Objects, coords: &[f64]) {
 
     // Set labels around new core neighbors
     set_cluster_label_around_new_core_neighbors(objects, &new_cores);
+
+    Some(inserted_id)
 }
 
 /// Separate neighbors of the inserted object into new cores and old cores.
-/// A "new core" is one that just reached min_pts neighbor_count due to this insertion.
+/// A "new core" is one that just reached min_pts neighbor_count due to this insertion,
+/// i.e. its neighbor_count was below min_pts before `weight` was added to it.
 /// The inserted object itself, if it's core, is always a new core.
 fn separate_core_neighbors_by_novelty(
     objects: &Objects,
     inserted_id: ObjectId,
+    weight: u32,
 ) -> (HashSet<ObjectId>, HashSet<ObjectId>) {
     let mut new_cores = HashSet::new();
     let mut old_cores = HashSet::new();
@@ -71,11 +77,13 @@ fn separate_core_neighbors_by_novelty(
 
     for &nid in &neighbors {
         let nc = objects.neighbor_count(nid);
-        if nc == objects.min_pts {
-            // Just became core
-            new_cores.insert(nid);
-        } else if nc > objects.min_pts {
-            old_cores.insert(nid);
+        if nc >= objects.min_pts {
+            if nc - weight < objects.min_pts {
+                // Just became core
+                new_cores.insert(nid);
+            } else {
+                old_cores.insert(nid);
+            }
         }
     }
 
@@ -17,6 +17,12 @@ impl LabelHandler {
         }
     }
 
+    /// Drop all labels, keeping the maps' allocations.
+    pub fn clear(&mut self) {
+        self.label_to_objects.clear();
+        self.object_to_label.clear();
+    }
+
     pub fn set_label(&mut self, obj_id: ObjectId, label: ClusterLabel) {
         if let Some(&previous_label) = self.object_to_label.get(&obj_id) {
             if let Some(set) = self.label_to_objects.get_mut(&previous_label) {
@@ -129,6 +135,16 @@ mod tests {
         assert_eq!(lh.get_next_cluster_label(), 1);
     }
 
+    #[test]
+    fn test_clear() {
+        let mut lh = LabelHandler::new();
+        lh.set_label_of_inserted_object(1);
+        lh.set_label(1, 3);
+        lh.clear();
+        assert_eq!(lh.get_label(1), None);
+        assert_eq!(lh.get_next_cluster_label(), CLUSTER_LABEL_FIRST_CLUSTER);
+    }
+
     #[test]
     fn test_set_labels_batch() {
         let mut lh = LabelHandler::new();
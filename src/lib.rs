@@ -12,15 +12,112 @@ mod types;
 #[cfg(feature = "extension-module")]
 mod pybridge {
     use crate::engine::IncrementalDbscan;
-    use numpy::{PyArray1, PyReadonlyArray2};
+    use crate::types::ObjectId;
+    use numpy::{PyArray1, PyReadonlyArray1, PyReadonlyArray2};
     use pyo3::prelude::*;
 
+    /// Point arrays accepted from Python. float32 input is read directly and
+    /// widened to f64 one row at a time, instead of NumPy converting the whole
+    /// array to a float64 copy first. Points hash by their f64 coordinates, so
+    /// a float32 point matches a float64 row only if that row holds exactly
+    /// the widened values (e.g. not float64 0.1 for float32 0.1).
+    #[derive(FromPyObject)]
+    enum Points<'py> {
+        F64(PyReadonlyArray2<'py, f64>),
+        F32(PyReadonlyArray2<'py, f32>),
+    }
+
+    impl Points<'_> {
+        fn nrows(&self) -> usize {
+            match self {
+                Points::F64(x) => x.as_array().nrows(),
+                Points::F32(x) => x.as_array().nrows(),
+            }
+        }
+
+        /// Call `f(i, coords)` for each row, reusing one f64 row buffer.
+        fn for_each_row(&self, mut f: impl FnMut(usize, &[f64])) {
+            let mut coords = Vec::new();
+            match self {
+                Points::F64(x) => {
+                    for (i, row) in x.as_array().rows().into_iter().enumerate() {
+                        coords.clear();
+                        coords.extend(row.iter().copied());
+                        f(i, &coords);
+                    }
+                }
+                Points::F32(x) => {
+                    for (i, row) in x.as_array().rows().into_iter().enumerate() {
+                        coords.clear();
+                        coords.extend(row.iter().map(|&v| f64::from(v)));
+                        f(i, &coords);
+                    }
+                }
+            }
+        }
+    }
+
     #[pyclass]
     #[pyo3(name = "IncrementalDBSCAN")]
     struct PyIncrementalDBSCAN {
         inner: IncrementalDbscan,
     }
 
+    impl PyIncrementalDBSCAN {
+        /// Insert each row of `x`, `weights[i]` times if weights are given.
+        /// Weights are validated up front so a bad entry inserts nothing. A row
+        /// whose total count (or a neighbor's) would exceed 2**32 - 1 raises
+        /// OverflowError without being inserted; earlier rows stay inserted.
+        fn insert_rows(
+            &mut self,
+            x: Points,
+            weights: Option<PyReadonlyArray1<u64>>,
+        ) -> PyResult<Vec<ObjectId>> {
+            let nrows = x.nrows();
+            let weights: Vec<u32> = match weights {
+                Some(w) => {
+                    let w = w.as_array();
+                    if w.len() != nrows {
+                        return Err(PyErr::new::<pyo3::exceptions::PyValueError, _>(
+                            "weights must have one entry per row of X",
+                        ));
+                    }
+                    w.iter()
+                        .map(|&wi| match u32::try_from(wi) {
+                            Ok(0) => Err(PyErr::new::<pyo3::exceptions::PyValueError, _>(
+                                "weights must be at least 1",
+                            )),
+                            Ok(wi) => Ok(wi),
+                            Err(_) => Err(PyErr::new::<pyo3::exceptions::PyOverflowError, _>(
+                                "weights must fit in 32 bits",
+                            )),
+                        })
+                        .collect::<PyResult<_>>()?
+                }
+                None => vec![1; nrows],
+            };
+
+            let mut ids = Vec::with_capacity(nrows);
+            let mut overflow_row = None;
+            let inner = &mut self.inner;
+            x.for_each_row(|i, coords| {
+                if overflow_row.is_some() {
+                    return;
+                }
+                match inner.insert_weighted(coords, weights[i]) {
+                    Some(id) => ids.push(id),
+                    None => overflow_row = Some(i),
+                }
+            });
+            match overflow_row {
+                Some(i) => Err(PyErr::new::<pyo3::exceptions::PyOverflowError, _>(format!(
+                    "inserting row {i} would push a point count past 2**32 - 1"
+                ))),
+                None => Ok(ids),
+            }
+        }
+    }
+
     #[pymethods]
     impl PyIncrementalDBSCAN {
         #[new]
@@ -46,39 +143,70 @@ mod pybridge {
             })
         }
 
-        fn insert(&mut self, x: PyReadonlyArray2<f64>) -> PyResult<()> {
-            let array = x.as_array();
-            for row in array.rows() {
-                let coords: Vec<f64> = row.to_vec();
-                self.inner.insert(&coords);
-            }
-            Ok(())
+        /// Returns one uint64 id per row, for use with `delete_by_ids`.
+        /// Identical rows share an id.
+        #[pyo3(signature = (x, weights=None))]
+        fn insert<'py>(
+            &mut self,
+            py: Python<'py>,
+            x: Points,
+            weights: Option<PyReadonlyArray1<u64>>,
+        ) -> PyResult<Bound<'py, PyArray1<ObjectId>>> {
+            let ids = self.insert_rows(x, weights)?;
+            Ok(PyArray1::from_vec(py, ids))
         }
 
-        fn delete(&mut self, x: PyReadonlyArray2<f64>) -> PyResult<Vec<bool>> {
-            let array = x.as_array();
-            let mut results = Vec::with_capacity(array.nrows());
-            for row in array.rows() {
-                let coords: Vec<f64> = row.to_vec();
-                results.push(self.inner.delete(&coords));
-            }
+        /// Same as `insert(x)` then `get_cluster_labels(x)`, without re-hashing
+        /// every row: labels are looked up by the ids returned from insertion.
+        #[pyo3(signature = (x, weights=None))]
+        fn insert_and_label<'py>(
+            &mut self,
+            py: Python<'py>,
+            x: Points,
+            weights: Option<PyReadonlyArray1<u64>>,
+        ) -> PyResult<Bound<'py, PyArray1<f64>>> {
+            let ids = self.insert_rows(x, weights)?;
+            // Labels are read only once the whole batch is in: later points
+            // can still change the label of earlier ones.
+            let labels: Vec<f64> = ids
+                .iter()
+                .map(|&id| match self.inner.get_label_by_id(id) {
+                    Some(label) => label as f64,
+                    None => f64::NAN,
+                })
+                .collect();
+            Ok(PyArray1::from_vec(py, labels))
+        }
+
+        /// Forget all points; parameters and allocated capacity are kept.
+        fn reset(&mut self) {
+            self.inner.reset();
+        }
+
+        fn delete(&mut self, x: Points) -> PyResult<Vec<bool>> {
+            let mut results = Vec::with_capacity(x.nrows());
+            x.for_each_row(|_, coords| results.push(self.inner.delete(coords)));
             Ok(results)
         }
 
+        /// Same as `delete`, but addressed by the ids returned from `insert`.
+        fn delete_by_ids(&mut self, ids: PyReadonlyArray1<ObjectId>) -> Vec<bool> {
+            ids.as_array()
+                .iter()
+                .map(|&id| self.inner.delete_by_id(id))
+                .collect()
+        }
+
         fn get_cluster_labels<'py>(
             &self,
             py: Python<'py>,
-            x: PyReadonlyArray2<f64>,
+            x: Points,
         ) -> PyResult<Bound<'py, PyArray1<f64>>> {
-            let array = x.as_array();
-            let mut labels = Vec::with_capacity(array.nrows());
-            for row in array.rows() {
-                let coords: Vec<f64> = row.to_vec();
-                match self.inner.get_label(&coords) {
-                    Some(label) => labels.push(label as f64),
-                    None => labels.push(f64::NAN),
-                }
-            }
+            let mut labels = Vec::with_capacity(x.nrows());
+            x.for_each_row(|_, coords| match self.inner.get_label(coords) {
+                Some(label) => labels.push(label as f64),
+                None => labels.push(f64::NAN),
+            });
             Ok(PyArray1::from_vec(py, labels))
         }
     }
@@ -38,6 +38,15 @@ impl Objects {
         }
     }
 
+    /// Remove every object, keeping allocated capacity for reuse.
+    pub fn clear(&mut self) {
+        self.graph.clear();
+        self.id_to_data.clear();
+        self.id_to_node.clear();
+        self.spatial.clear();
+        self.labels.clear();
+    }
+
     /// Hash coords and look up existing object.
     pub fn get_object_id(&self, coords: &[f64]) -> Option<ObjectId> {
         let id = hash_coords(coords);
@@ -48,53 +57,64 @@ impl Objects {
         }
     }
 
-    /// Insert an object (or increment its count if duplicate).
-    /// Returns the ObjectId of the inserted object and whether it's a new object.
-    pub fn insert_object(&mut self, coords: &[f64]) -> ObjectId {
+    /// Insert `weight` copies of an object (or increment its count if duplicate).
+    /// Returns the ObjectId of the inserted object, or None, leaving everything
+    /// unchanged, if its count or any neighbor_count would overflow u32.
+    pub fn insert_object(&mut self, coords: &[f64], weight: u32) -> Option<ObjectId> {
         let object_id = hash_coords(coords);
 
         if self.id_to_data.contains_key(&object_id) {
             // Duplicate: increment count, increment neighbor_count for all neighbors
-            let data = self.id_to_data.get_mut(&object_id).unwrap();
-            data.count += 1;
-
-            // Get all neighbors including self
             let neighbor_ids = self.neighbor_ids_including_self(object_id);
-            for nid in &neighbor_ids {
-                self.id_to_data.get_mut(nid).unwrap().neighbor_count += 1;
+            let count = self.id_to_data[&object_id].count.checked_add(weight)?;
+            let neighbor_counts = neighbor_ids
+                .iter()
+                .map(|nid| self.id_to_data[nid].neighbor_count.checked_add(weight))
+                .collect::<Option<Vec<_>>>()?;
+
+            self.id_to_data.get_mut(&object_id).unwrap().count = count;
+            for (nid, nc) in neighbor_ids.iter().zip(neighbor_counts) {
+                self.id_to_data.get_mut(nid).unwrap().neighbor_count = nc;
             }
 
-            return object_id;
+            return Some(object_id);
+        }
+
+        // Query before inserting so the counts can be checked while nothing
+        // has changed yet; the new object itself contributes `weight`.
+        let spatial_neighbors = if self.id_to_data.is_empty() {
+            Vec::new()
+        } else {
+            self.spatial.query_radius(coords)
+        };
+        let mut neighbor_count = weight;
+        for nid in &spatial_neighbors {
+            let nd = &self.id_to_data[nid];
+            nd.neighbor_count.checked_add(weight)?;
+            neighbor_count = neighbor_count.checked_add(nd.count)?;
         }
 
         // New object: create node in graph
         let node_idx = self.graph.add_node(object_id);
-        let new_obj = ObjectData::new(object_id, node_idx, self.min_pts);
+        let mut new_obj = ObjectData::new(object_id, node_idx, self.min_pts);
+        new_obj.count = weight;
+        new_obj.neighbor_count = neighbor_count;
 
         self.id_to_data.insert(object_id, new_obj);
         self.id_to_node.insert(object_id, node_idx);
         self.labels.set_label_of_inserted_object(object_id);
         self.spatial.insert(object_id, coords);
 
-        // Query spatial index for neighbors (includes self since we just inserted)
-        let spatial_neighbors = self.spatial.query_radius(coords);
-
         for &nid in &spatial_neighbors {
-            // Increment neighbor's neighbor_count by 1 (the new object counts)
-            self.id_to_data.get_mut(&nid).unwrap().neighbor_count += 1;
+            // Increment neighbor's neighbor_count by the new object's count
+            self.id_to_data.get_mut(&nid).unwrap().neighbor_count += weight;
 
-            if nid != object_id {
-                // For the new object: increment its neighbor_count by neighbor's count
-                let neighbor_count = self.id_to_data[&nid].count;
-                self.id_to_data.get_mut(&object_id).unwrap().neighbor_count += neighbor_count;
-
-                // Add graph edge
-                let nid_node = self.id_to_node[&nid];
-                self.graph.add_edge(node_idx, nid_node, ());
-            }
+            // Add graph edge
+            let nid_node = self.id_to_node[&nid];
+            self.graph.add_edge(node_idx, nid_node, ());
         }
 
-        object_id
+        Some(object_id)
     }
 
     /// Delete an object (decrement count, or fully remove if count reaches 0).
@@ -1,18 +1,67 @@
+use std::collections::HashMap;
+
 use rayon::prelude::*;
 
-use crate::distance::{minkowski_distance, squared_euclidean_within};
+use crate::distance::{dot, minkowski_distance, squared_euclidean_within};
 use crate::types::ObjectId;
 
 /// Minimum number of stored points before switching to parallel scan.
 /// Below this, rayon's thread pool overhead exceeds the parallelism benefit.
 const PARALLEL_THRESHOLD: usize = 1000;
 
-/// Brute-force spatial index with O(1) insert, O(1) delete, O(n) query.
-/// Trades query speed for incremental insert/delete efficiency.
+/// Above this dimensionality the eps-ball straddles nearly every split plane,
+/// so a KD-tree prunes almost nothing and the brute-force scan is used instead.
+const KD_TREE_MAX_DIMS: usize = 16;
+
+/// Leaves are split on demand once they hold more than this many slots.
+const LEAF_SIZE: usize = 16;
+
+/// A subtree is rebuilt when one child holds more than this fraction of it.
+const BALANCE_ALPHA: f64 = 0.75;
+
+/// Bound on the rounding error of the expanded-form squared distance,
+/// relative to ||x||² + ||q||². Comfortably above the true bound for
+/// KD_TREE_MAX_DIMS dimensions.
+const EXPANDED_FORM_TOLERANCE: f64 = 1e-12;
+
+/// Relative slack on eps when pruning split planes, so rounding can never
+/// prune a subtree holding a point the exact distance check would accept.
+const PRUNE_SLACK: f64 = 1e-9;
+
+enum KdNode {
+    /// Slot indices into the flat storage (may include tombstoned slots).
+    Leaf(Vec<usize>),
+    /// Points with `coord[dim] < value` go left, the rest go right.
+    /// `size` counts all slots in the subtree, tombstones included.
+    Split {
+        dim: usize,
+        value: f64,
+        left: usize,
+        right: usize,
+        size: usize,
+    },
+}
+
+/// Spatial index for eps-range queries.
+///
+/// Points live in flat slot storage. For low-dimensional data a KD-tree over
+/// the slots is maintained incrementally: leaves split on demand along their
+/// max-variance dimension, and a subtree that grows lopsided is rebuilt
+/// (scapegoat style). High-dimensional data falls back to a brute-force scan.
+/// Deletes only tombstone the slot; storage and tree are compacted once
+/// tombstones make up half of the slots.
 pub struct SpatialIndex {
     /// Flat storage: coords[i*dims..(i+1)*dims] are the coordinates for ids[i]
     coords: Vec<f64>,
     ids: Vec<ObjectId>,
+    /// Squared Euclidean norm of each slot, for the expanded-form distance
+    norms_sq: Vec<f64>,
+    alive: Vec<bool>,
+    id_to_slot: HashMap<ObjectId, usize>,
+    n_dead: usize,
+    /// KD-tree arena (root at 0), empty when the brute-force scan is used
+    nodes: Vec<KdNode>,
+    free_nodes: Vec<usize>,
     dims: usize,
     eps: f64,
     p: f64,
@@ -23,6 +72,12 @@ impl SpatialIndex {
         Self {
             coords: Vec::new(),
             ids: Vec::new(),
+            norms_sq: Vec::new(),
+            alive: Vec::new(),
+            id_to_slot: HashMap::new(),
+            n_dead: 0,
+            nodes: Vec::new(),
+            free_nodes: Vec::new(),
             dims: 0,
             eps,
             p,
@@ -30,85 +85,381 @@ impl SpatialIndex {
     }
 
     pub fn insert(&mut self, id: ObjectId, coords: &[f64]) {
-        if self.ids.is_empty() {
+        if self.id_to_slot.is_empty() {
+            self.clear();
             self.dims = coords.len();
         }
         debug_assert_eq!(coords.len(), self.dims);
+        let slot = self.ids.len();
         self.coords.extend_from_slice(coords);
         self.ids.push(id);
+        self.norms_sq.push(dot(coords, coords));
+        self.alive.push(true);
+        self.id_to_slot.insert(id, slot);
+
+        if self.uses_tree() {
+            self.tree_insert(slot);
+        }
     }
 
     pub fn delete(&mut self, id: ObjectId) {
-        if let Some(pos) = self.ids.iter().position(|&x| x == id) {
-            let last = self.ids.len() - 1;
-            // Swap-remove for O(1) deletion
-            self.ids.swap(pos, last);
-            self.ids.pop();
-
-            // Swap coordinate blocks
-            if pos != last {
-                let start_pos = pos * self.dims;
-                let start_last = last * self.dims;
-                for d in 0..self.dims {
-                    self.coords.swap(start_pos + d, start_last + d);
-                }
+        if let Some(slot) = self.id_to_slot.remove(&id) {
+            self.alive[slot] = false;
+            self.n_dead += 1;
+
+            if self.id_to_slot.is_empty() {
+                self.clear();
+            } else if self.n_dead * 2 > self.ids.len() {
+                self.compact();
             }
-            self.coords.truncate(last * self.dims);
         }
     }
 
     /// Find all objects within eps distance of the query point.
     pub fn query_radius(&self, query: &[f64]) -> Vec<ObjectId> {
         debug_assert_eq!(query.len(), self.dims);
-        let n = self.ids.len();
 
-        if self.p == 2.0 {
+        if self.uses_tree() {
+            self.query_tree(query)
+        } else if self.p == 2.0 && self.ids.len() >= PARALLEL_THRESHOLD {
+            // Parallel scan with rayon + early termination
             let eps_sq = self.eps * self.eps;
+            let dims = self.dims;
+            let coords = &self.coords;
+            let ids = &self.ids;
+            let alive = &self.alive;
 
-            if n >= PARALLEL_THRESHOLD {
-                // Parallel scan with rayon + early termination
-                let ids = &self.ids;
-                let coords = &self.coords;
-                let dims = self.dims;
-
-                (0..n)
-                    .into_par_iter()
-                    .filter_map(|i| {
-                        let start = i * dims;
-                        let point = &coords[start..start + dims];
-                        if squared_euclidean_within(query, point, eps_sq) {
-                            Some(ids[i])
-                        } else {
-                            None
-                        }
-                    })
-                    .collect()
-            } else {
-                // Sequential scan with early termination for small datasets
-                let mut result = Vec::new();
-                for i in 0..n {
-                    let start = i * self.dims;
-                    let point = &self.coords[start..start + self.dims];
-                    if squared_euclidean_within(query, point, eps_sq) {
-                        result.push(self.ids[i]);
+            (0..ids.len())
+                .into_par_iter()
+                .filter_map(|i| {
+                    let start = i * dims;
+                    let point = &coords[start..start + dims];
+                    if alive[i] && squared_euclidean_within(query, point, eps_sq) {
+                        Some(ids[i])
+                    } else {
+                        None
                     }
-                }
-                result
-            }
+                })
+                .collect()
         } else {
-            // Non-Euclidean metrics: sequential scan (rayon possible but less common)
             let mut result = Vec::new();
-            for i in 0..n {
-                let start = i * self.dims;
-                let end = start + self.dims;
-                let point = &self.coords[start..end];
-                if minkowski_distance(query, point, self.p) <= self.eps {
-                    result.push(self.ids[i]);
+            for slot in 0..self.ids.len() {
+                if self.alive[slot] && self.is_neighbor(query, self.point(slot)) {
+                    result.push(self.ids[slot]);
                 }
             }
             result
         }
     }
+
+    #[inline]
+    fn uses_tree(&self) -> bool {
+        self.dims <= KD_TREE_MAX_DIMS
+    }
+
+    #[inline]
+    fn point(&self, slot: usize) -> &[f64] {
+        let start = slot * self.dims;
+        &self.coords[start..start + self.dims]
+    }
+
+    #[inline]
+    fn is_neighbor(&self, query: &[f64], point: &[f64]) -> bool {
+        if self.p == 2.0 {
+            squared_euclidean_within(query, point, self.eps * self.eps)
+        } else {
+            minkowski_distance(query, point, self.p) <= self.eps
+        }
+    }
+
+    /// Euclidean check via ||x||² + ||q||² - 2 x·q using the cached norm, so
+    /// the inner loop is a single dot product. Results within rounding
+    /// distance of eps² are settled by the exact kernel, so this always
+    /// agrees with `squared_euclidean_within`.
+    #[inline]
+    fn within_expanded(&self, query: &[f64], query_norm_sq: f64, slot: usize) -> bool {
+        let point = self.point(slot);
+        let norms = query_norm_sq + self.norms_sq[slot];
+        let d2 = norms - 2.0 * dot(query, point);
+        let eps_sq = self.eps * self.eps;
+        let tolerance = EXPANDED_FORM_TOLERANCE * norms;
+        if d2 < eps_sq - tolerance {
+            true
+        } else if d2 > eps_sq + tolerance {
+            false
+        } else {
+            squared_euclidean_within(query, point, eps_sq)
+        }
+    }
+
+    /// Drop all points, keeping allocated storage for reuse.
+    pub fn clear(&mut self) {
+        self.coords.clear();
+        self.ids.clear();
+        self.norms_sq.clear();
+        self.alive.clear();
+        self.id_to_slot.clear();
+        self.n_dead = 0;
+        self.nodes.clear();
+        self.free_nodes.clear();
+    }
+
+    /// Drop tombstoned slots and rebuild the tree over the survivors.
+    fn compact(&mut self) {
+        let mut coords = Vec::with_capacity(self.id_to_slot.len() * self.dims);
+        let mut ids = Vec::with_capacity(self.id_to_slot.len());
+        let mut norms_sq = Vec::with_capacity(self.id_to_slot.len());
+        for slot in 0..self.ids.len() {
+            if self.alive[slot] {
+                coords.extend_from_slice(self.point(slot));
+                ids.push(self.ids[slot]);
+                norms_sq.push(self.norms_sq[slot]);
+            }
+        }
+        self.coords = coords;
+        self.ids = ids;
+        self.norms_sq = norms_sq;
+        self.alive = vec![true; self.ids.len()];
+        self.id_to_slot = self
+            .ids
+            .iter()
+            .enumerate()
+            .map(|(slot, &id)| (id, slot))
+            .collect();
+        self.n_dead = 0;
+
+        self.nodes.clear();
+        self.free_nodes.clear();
+        if self.uses_tree() {
+            self.nodes.push(KdNode::Leaf(Vec::new()));
+            self.build(0, (0..self.ids.len()).collect());
+        }
+    }
+
+    // KD-tree
+
+    fn query_tree(&self, query: &[f64]) -> Vec<ObjectId> {
+        let mut result = Vec::new();
+        if self.nodes.is_empty() {
+            return result;
+        }
+        let reach = self.eps * (1.0 + PRUNE_SLACK);
+        let query_norm_sq = dot(query, query);
+
+        let mut stack = vec![0];
+        while let Some(idx) = stack.pop() {
+            match &self.nodes[idx] {
+                KdNode::Leaf(slots) if self.p == 2.0 => {
+                    for &slot in slots {
+                        if self.alive[slot] && self.within_expanded(query, query_norm_sq, slot) {
+                            result.push(self.ids[slot]);
+                        }
+                    }
+                }
+                KdNode::Leaf(slots) => {
+                    for &slot in slots {
+                        if self.alive[slot] && self.is_neighbor(query, self.point(slot)) {
+                            result.push(self.ids[slot]);
+                        }
+                    }
+                }
+                KdNode::Split {
+                    dim,
+                    value,
+                    left,
+                    right,
+                    ..
+                } => {
+                    // Every Minkowski distance bounds the per-axis distance,
+                    // so a side is skipped when the plane is beyond eps.
+                    let diff = query[*dim] - value;
+                    if diff < reach {
+                        stack.push(*left);
+                    }
+                    if -diff <= reach {
+                        stack.push(*right);
+                    }
+                }
+            }
+        }
+        result
+    }
+
+    fn tree_insert(&mut self, slot: usize) {
+        if self.nodes.is_empty() {
+            self.nodes.push(KdNode::Leaf(vec![slot]));
+            return;
+        }
+
+        let mut path = Vec::new();
+        let mut idx = 0;
+        while let KdNode::Split {
+            dim,
+            value,
+            left,
+            right,
+            size,
+        } = &mut self.nodes[idx]
+        {
+            *size += 1;
+            path.push(idx);
+            idx = if self.coords[slot * self.dims + *dim] < *value {
+                *left
+            } else {
+                *right
+            };
+        }
+
+        let KdNode::Leaf(slots) = &mut self.nodes[idx] else {
+            unreachable!()
+        };
+        slots.push(slot);
+        if slots.len() > LEAF_SIZE {
+            // Split on demand; rebalance if the new leaves sit too deep
+            let slots = std::mem::take(slots);
+            self.build(idx, slots);
+            if path.len() + 1 > self.depth_limit() {
+                self.rebalance(&path);
+            }
+        }
+    }
+
+    /// Roughly twice the depth of a balanced tree over the current slots.
+    fn depth_limit(&self) -> usize {
+        let leaves = self.ids.len() / LEAF_SIZE + 1;
+        2 * (usize::BITS - leaves.leading_zeros()) as usize + 2
+    }
+
+    fn node_size(&self, idx: usize) -> usize {
+        match &self.nodes[idx] {
+            KdNode::Leaf(slots) => slots.len(),
+            KdNode::Split { size, .. } => *size,
+        }
+    }
+
+    /// Rebuild the lowest lopsided ancestor on the insertion path.
+    fn rebalance(&mut self, path: &[usize]) {
+        for &idx in path.iter().rev() {
+            if let KdNode::Split {
+                left, right, size, ..
+            } = self.nodes[idx]
+            {
+                let largest = self.node_size(left).max(self.node_size(right));
+                if largest as f64 > BALANCE_ALPHA * size as f64 {
+                    self.rebuild_subtree(idx);
+                    return;
+                }
+            }
+        }
+    }
+
+    fn rebuild_subtree(&mut self, root: usize) {
+        let mut slots = Vec::with_capacity(self.node_size(root));
+        let mut stack = vec![root];
+        while let Some(idx) = stack.pop() {
+            match &mut self.nodes[idx] {
+                KdNode::Leaf(leaf_slots) => slots.append(leaf_slots),
+                KdNode::Split { left, right, .. } => {
+                    stack.push(*left);
+                    stack.push(*right);
+                }
+            }
+            if idx != root {
+                self.free_nodes.push(idx);
+            }
+        }
+        self.build(root, slots);
+    }
+
+    /// Build a balanced subtree over `slots` rooted at node `root`.
+    fn build(&mut self, root: usize, slots: Vec<usize>) {
+        let mut stack = vec![(root, slots)];
+        while let Some((idx, slots)) = stack.pop() {
+            if slots.len() <= LEAF_SIZE {
+                self.nodes[idx] = KdNode::Leaf(slots);
+                continue;
+            }
+            match self.partition(&slots) {
+                Some((dim, value, left_slots, right_slots)) => {
+                    let left = self.alloc_leaf();
+                    let right = self.alloc_leaf();
+                    self.nodes[idx] = KdNode::Split {
+                        dim,
+                        value,
+                        left,
+                        right,
+                        size: slots.len(),
+                    };
+                    stack.push((left, left_slots));
+                    stack.push((right, right_slots));
+                }
+                // All slots coincide: nothing to split on
+                None => self.nodes[idx] = KdNode::Leaf(slots),
+            }
+        }
+    }
+
+    fn alloc_leaf(&mut self) -> usize {
+        match self.free_nodes.pop() {
+            Some(idx) => {
+                self.nodes[idx] = KdNode::Leaf(Vec::new());
+                idx
+            }
+            None => {
+                self.nodes.push(KdNode::Leaf(Vec::new()));
+                self.nodes.len() - 1
+            }
+        }
+    }
+
+    /// Split `slots` at the median of their max-variance dimension.
+    /// Returns None if the slots have no spread in any dimension.
+    fn partition(&self, slots: &[usize]) -> Option<(usize, f64, Vec<usize>, Vec<usize>)> {
+        let n = slots.len() as f64;
+        let mut dim = 0;
+        let mut best_variance = 0.0;
+        for d in 0..self.dims {
+            let mean = slots
+                .iter()
+                .map(|&s| self.coords[s * self.dims + d])
+                .sum::<f64>()
+                / n;
+            let variance = slots
+                .iter()
+                .map(|&s| {
+                    let x = self.coords[s * self.dims + d] - mean;
+                    x * x
+                })
+                .sum::<f64>();
+            if variance > best_variance {
+                best_variance = variance;
+                dim = d;
+            }
+        }
+        if best_variance <= 0.0 {
+            return None;
+        }
+
+        let coord = |s: usize| self.coords[s * self.dims + dim];
+        let mut values: Vec<f64> = slots.iter().map(|&s| coord(s)).collect();
+        let mid = values.len() / 2;
+        let (_, &mut median, _) = values.select_nth_unstable_by(mid, f64::total_cmp);
+
+        // If the median is also the minimum, split just above it instead
+        let value = if values.iter().any(|&x| x < median) {
+            median
+        } else {
+            values
+                .iter()
+                .copied()
+                .filter(|&x| x > median)
+                .min_by(f64::total_cmp)?
+        };
+
+        let (left, right): (Vec<usize>, Vec<usize>) =
+            slots.iter().partition(|&&s| coord(s) < value);
+        Some((dim, value, left, right))
+    }
 }
 
 #[cfg(test)]
@@ -154,6 +505,145 @@ mod tests {
         assert_eq!(neighbors, vec![2]);
     }
 
+    /// Small deterministic generator so the tests need no extra crates.
+    fn xorshift(state: &mut u64) -> f64 {
+        *state ^= *state << 13;
+        *state ^= *state >> 7;
+        *state ^= *state << 17;
+        (*state >> 11) as f64 / (1u64 << 53) as f64
+    }
+
+    fn brute_force(
+        points: &[(ObjectId, Vec<f64>)],
+        query: &[f64],
+        eps: f64,
+        p: f64,
+    ) -> Vec<ObjectId> {
+        let mut ids: Vec<ObjectId> = points
+            .iter()
+            .filter(|(_, coords)| minkowski_distance(query, coords, p) <= eps)
+            .map(|&(id, _)| id)
+            .collect();
+        ids.sort_unstable();
+        ids
+    }
+
+    fn sorted(mut ids: Vec<ObjectId>) -> Vec<ObjectId> {
+        ids.sort_unstable();
+        ids
+    }
+
+    #[test]
+    fn test_kd_tree_matches_brute_force() {
+        for &(dims, p) in &[(1, 2.0), (2, 2.0), (3, 1.0), (5, f64::INFINITY), (8, 3.0)] {
+            let mut state = 0x9E37_79B9_7F4A_7C15;
+            let mut idx = SpatialIndex::new(0.8, p);
+            let mut points = Vec::new();
+            for id in 0..2000 {
+                let coords: Vec<f64> = (0..dims).map(|_| xorshift(&mut state) * 10.0).collect();
+                idx.insert(id, &coords);
+                points.push((id, coords));
+            }
+            assert!(!idx.nodes.is_empty());
+
+            for (_, query) in points.iter().step_by(37) {
+                assert_eq!(
+                    sorted(idx.query_radius(query)),
+                    brute_force(&points, query, 0.8, p)
+                );
+            }
+        }
+    }
+
+    #[test]
+    fn test_kd_tree_sorted_inserts_stay_balanced() {
+        // Sorted input is the worst case for split-on-demand leaves
+        let mut idx = SpatialIndex::new(1.5, 2.0);
+        let mut points = Vec::new();
+        for id in 0..5000 {
+            let coords = vec![id as f64 * 0.1, 0.0];
+            idx.insert(id, &coords);
+            points.push((id, coords));
+        }
+
+        let mut max_depth = 0;
+        let mut stack = vec![(0, 0)];
+        while let Some((node, depth)) = stack.pop() {
+            max_depth = max_depth.max(depth);
+            if let KdNode::Split { left, right, .. } = idx.nodes[node] {
+                stack.push((left, depth + 1));
+                stack.push((right, depth + 1));
+            }
+        }
+        assert!(max_depth <= idx.depth_limit() + 1, "depth {max_depth}");
+
+        for (_, query) in points.iter().step_by(97) {
+            assert_eq!(
+                sorted(idx.query_radius(query)),
+                brute_force(&points, query, 1.5, 2.0)
+            );
+        }
+    }
+
+    #[test]
+    fn test_kd_tree_deletes_and_compaction() {
+        let mut state = 42;
+        let mut idx = SpatialIndex::new(1.0, 2.0);
+        let mut points = Vec::new();
+        for id in 0..1000 {
+            let coords = vec![xorshift(&mut state) * 10.0, xorshift(&mut state) * 10.0];
+            idx.insert(id, &coords);
+            points.push((id, coords));
+        }
+
+        // Delete every other point: crosses the tombstone threshold once
+        for id in (0..1000).step_by(2) {
+            idx.delete(id);
+        }
+        points.retain(|&(id, _)| id % 2 == 1);
+        assert!(idx.n_dead * 2 <= idx.ids.len());
+
+        for (_, query) in points.iter().step_by(11) {
+            assert_eq!(
+                sorted(idx.query_radius(query)),
+                brute_force(&points, query, 1.0, 2.0)
+            );
+        }
+    }
+
+    #[test]
+    fn test_reset_dims_after_deleting_everything() {
+        let mut idx = SpatialIndex::new(1.5, 2.0);
+        idx.insert(1, &[0.0, 0.0]);
+        idx.delete(1);
+        idx.insert(2, &[0.0, 0.0, 0.0]);
+        assert_eq!(idx.query_radius(&[0.0, 0.0, 0.0]), vec![2]);
+    }
+
+    #[test]
+    fn test_high_dims_use_brute_force() {
+        let mut idx = SpatialIndex::new(1.5, 2.0);
+        idx.insert(1, &[0.0; KD_TREE_MAX_DIMS + 1]);
+        assert!(idx.nodes.is_empty());
+        assert_eq!(idx.query_radius(&[0.0; KD_TREE_MAX_DIMS + 1]), vec![1]);
+    }
+
+    #[test]
+    fn test_expanded_form_boundary_far_from_origin() {
+        // Large norms make the expanded form lose precision; points right on
+        // the eps boundary must still match the exact check.
+        let mut idx = SpatialIndex::new(1.0, 2.0);
+        let base = [1e6, -1e6];
+        idx.insert(1, &base);
+        idx.insert(2, &[base[0] + 1.0, base[1]]); // exactly eps away
+        idx.insert(3, &[base[0] + 1.0 + 1e-9, base[1]]); // just outside
+
+        let neighbors = idx.query_radius(&base);
+        assert!(neighbors.contains(&1));
+        assert!(neighbors.contains(&2));
+        assert!(!neighbors.contains(&3));
+    }
+
     #[test]
     fn test_empty_query() {
         let idx = SpatialIndex::new(1.5, 2.0);
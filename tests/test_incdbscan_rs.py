@@ -1,9 +1,12 @@
 """Tests for incdbscan_rs.
 
 Covers: noise, cluster creation, absorption, merge, splits, duplicates,
-multi-dimensional data, deletion, and cross-validation against sklearn.
+multi-dimensional data, deletion, and cross-validation against a reference
+batch DBSCAN.
 """
 
+from contextlib import nullcontext
+
 import numpy as np
 import pytest
 
@@ -13,38 +16,123 @@ EPS = 1.5
 NOISE = -1
 
 
+# ---------------------------------------------------------------------------
+# Fixtures: point sets built once at import and shared (read-only) by tests
+# ---------------------------------------------------------------------------
+
+def _points(rows):
+    arr = np.ascontiguousarray(rows, dtype=np.float32)
+    arr.flags.writeable = False
+    return arr
+
+
+_P_ORIGIN = _points([[0.0, 0.0]])
+_TWO_PTS = _points([[0.0, 0.0], [1.0, 0.0]])
+_TRI_APEX = _points([[0.5, 0.5]])
+_TRI_CLUSTER = _points([[0.0, 0.0], [1.0, 0.0], [0.5, 0.5]])
+_FAR_PT = _points([[10.0, 10.0]])
+_FAR_CLUSTER = _points([[10.0, 10.0], [11.0, 10.0], [10.5, 10.5]])
+_TIGHT_CORE = _points([[0.0, 0.0], [0.5, 0.0], [0.0, 0.5]])
+_BORDER = _points([[EPS, 0.0]])
+_MISSING = _points([[99.0, 99.0]])
+_L_SHAPE = _points([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
+_DIAGONAL = _points([[0.0, 0.0], [1.0, 1.0], [0.5, 0.5]])
+
+# Chains used by the staged merge/split tests
+_LEFT_CHAIN = _points([[-EPS, 0.0], [-EPS * 2, 0.0], [-EPS * 3, 0.0]])
+_RIGHT_CHAIN = _points([[EPS, 0.0], [EPS * 2, 0.0], [EPS * 3, 0.0]])
+_TOP_CHAIN = _points([[0.0, EPS], [0.0, EPS * 2], [0.0, EPS * 3]])
+_BOTTOM_CHAIN = _points([[0.0, -EPS], [0.0, -EPS * 2], [0.0, -EPS * 3]])
+_BRIDGE = _points([[0.0, 0.0]])
+
+# Chains + bridge stacked once; merge/split tests take row-slice views
+_SPLIT_2WAY = _points(np.concatenate([_LEFT_CHAIN, _RIGHT_CHAIN, _BRIDGE]))
+_SPLIT_3WAY = _points(
+    np.concatenate([_LEFT_CHAIN, _TOP_CHAIN, _BOTTOM_CHAIN, _BRIDGE])
+)
+
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
 def labels_of(db, points):
-    return db.get_cluster_labels(np.atleast_2d(points))
+    # Fast path: 2D, C-contiguous float32 ("f") or float64 ("d") goes straight in.
+    if (
+        type(points) is np.ndarray
+        and points.ndim == 2
+        and points.dtype.char in "fd"
+        and points.flags.c_contiguous
+    ):
+        return db.get_cluster_labels(points)
+    return db.get_cluster_labels(
+        np.ascontiguousarray(np.atleast_2d(points), dtype=np.float64)
+    )
 
 
-def assert_all_same_cluster(db, points):
-    labs = labels_of(db, points)
-    assert len(set(labs)) == 1 and labs[0] >= 0, f"Expected one cluster, got {labs}"
+def labels_of_many(db, *arrays):
+    """Label several point arrays with one query; returns one label array each."""
+    labs = labels_of(db, np.concatenate(arrays))
+    return np.split(labs, np.cumsum([len(a) for a in arrays[:-1]]))
 
 
-def assert_all_noise(db, points):
-    labs = labels_of(db, points)
+def label_mask(labs):
+    """Bitset of the labels present: bit 0 is noise, bit k + 1 is cluster k."""
+    labs = np.asarray(labs)
+    assert np.all(np.isfinite(labs) & (labs >= NOISE)), (
+        f"Expected cluster or noise labels, got {labs}"
+    )
+    mask = 0
+    for v in labs:
+        mask |= 1 << (int(v) + 1)
+    return mask
+
+
+def n_distinct(labs):
+    return bin(label_mask(labs)).count("1")
+
+
+def assert_one_cluster(labs):
+    assert n_distinct(labs) == 1 and labs[0] >= 0, f"Expected one cluster, got {labs}"
+
+
+def assert_noise(labs):
     assert np.all(labs == NOISE), f"Expected all noise, got {labs}"
 
 
+def assert_all_same_cluster(db, points):
+    assert_one_cluster(labels_of(db, points))
+
+
 def assert_all_nan(db, points):
     labs = labels_of(db, points)
     assert np.all(np.isnan(labs)), f"Expected all NaN, got {labs}"
 
 
 def are_lists_isomorphic(list_1, list_2):
-    if len(list_1) != len(list_2):
-        return False
-    distinct_1 = set(list_1)
-    distinct_2 = set(list_2)
-    if len(distinct_1) != len(distinct_2):
+    a = np.asarray(list_1, dtype=np.int64)
+    b = np.asarray(list_2, dtype=np.int64)
+    if a.size != b.size:
         return False
-    mappings = set(zip(list_1, list_2))
-    return len(distinct_1) == len(mappings)
+    if a.size == 0:
+        return True
+    # Encode each (a, b) pair as a single int64 so np.unique counts mappings.
+    b_min = b.min()
+    pairs = a * (b.max() - b_min + 1) + (b - b_min)
+    n_distinct = np.unique(a).size
+    return n_distinct == np.unique(b).size == np.unique(pairs).size
+
+
+@pytest.fixture(scope="class")
+def _shared_db():
+    return IncrementalDBSCAN(eps=EPS, min_pts=3)
+
+
+@pytest.fixture
+def db(_shared_db):
+    """One IncrementalDBSCAN(eps=EPS, min_pts=3) per class, reset per test."""
+    _shared_db.reset()
+    return _shared_db
 
 
 # ---------------------------------------------------------------------------
@@ -52,62 +140,75 @@ def are_lists_isomorphic(list_1, list_2):
 # ---------------------------------------------------------------------------
 
 class TestConstruction:
-    def test_default_params(self):
-        db = IncrementalDBSCAN()
-        assert db is not None
-
-    def test_custom_params(self):
-        db = IncrementalDBSCAN(eps=2.0, min_pts=10, p=1.0)
-        assert db is not None
-
-    def test_invalid_eps(self):
-        with pytest.raises(ValueError):
-            IncrementalDBSCAN(eps=-1.0)
+    @pytest.mark.parametrize(
+        "kw,exc",
+        [
+            ({}, None),
+            ({"eps": 2.0, "min_pts": 10, "p": 1.0}, None),
+            ({"eps": -1.0}, ValueError),
+            ({"eps": 0.0}, ValueError),
+            ({"min_pts": 0}, (ValueError, OverflowError)),
+            ({"p": 0.5}, ValueError),
+        ],
+        ids=["default", "custom", "negative_eps", "zero_eps", "zero_min_pts", "small_p"],
+    )
+    def test_params(self, kw, exc):
+        with pytest.raises(exc) if exc else nullcontext():
+            IncrementalDBSCAN(**kw)
 
-    def test_invalid_eps_zero(self):
-        with pytest.raises(ValueError):
-            IncrementalDBSCAN(eps=0.0)
 
-    def test_invalid_min_pts(self):
-        with pytest.raises((ValueError, OverflowError)):
-            IncrementalDBSCAN(min_pts=0)
+# ---------------------------------------------------------------------------
+# Insertion: noise and cluster creation
+# ---------------------------------------------------------------------------
 
-    def test_invalid_p(self):
-        with pytest.raises(ValueError):
-            IncrementalDBSCAN(p=0.5)
+class TestNoiseAndCreation:
+    @pytest.mark.parametrize(
+        "pts,expect",
+        [
+            (_P_ORIGIN, [NOISE]),
+            (_TWO_PTS, [NOISE, NOISE]),
+            (_TRI_CLUSTER, [0, 0, 0]),
+            (_points(np.concatenate([_TRI_CLUSTER, _FAR_PT])), [0, 0, 0, NOISE]),
+        ],
+        ids=["single_point", "two_points", "three_close_points", "far_point"],
+    )
+    def test_labels(self, db, pts, expect):
+        np.testing.assert_array_equal(db.insert_and_label(pts), expect)
 
 
 # ---------------------------------------------------------------------------
-# Insertion: noise and cluster creation
+# Insertion: insert_and_label
 # ---------------------------------------------------------------------------
 
-class TestNoiseAndCreation:
-    def test_single_point_is_noise(self):
+class TestInsertAndLabel:
+    def test_matches_insert_then_get_labels(self):
+        pts = np.concatenate([_TRI_CLUSTER, _FAR_CLUSTER, _MISSING, _P_ORIGIN])
+        db_a = IncrementalDBSCAN(eps=EPS, min_pts=3)
+        db_b = IncrementalDBSCAN(eps=EPS, min_pts=3)
+        db_a.insert(pts)
+        expected = labels_of(db_a, pts)
+        np.testing.assert_array_equal(db_b.insert_and_label(pts), expected)
+
+    def test_labels_reflect_whole_batch(self):
+        # The first two points are noise until the third arrives
         db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        p = np.array([[0.0, 0.0]])
-        db.insert(p)
-        assert_all_noise(db, p)
+        assert_one_cluster(db.insert_and_label(_TRI_CLUSTER))
 
-    def test_two_points_are_noise(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        pts = np.array([[0.0, 0.0], [1.0, 0.0]])
-        db.insert(pts)
-        assert_all_noise(db, pts)
 
-    def test_three_close_points_form_cluster(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        pts = np.array([[0.0, 0.0], [1.0, 0.0], [0.5, 0.5]])
-        db.insert(pts)
-        assert_all_same_cluster(db, pts)
+# ---------------------------------------------------------------------------
+# Input dtypes
+# ---------------------------------------------------------------------------
 
-    def test_far_point_stays_noise(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        cluster = np.array([[0.0, 0.0], [1.0, 0.0], [0.5, 0.5]])
-        far = np.array([[10.0, 10.0]])
-        db.insert(cluster)
-        db.insert(far)
-        assert_all_same_cluster(db, cluster)
-        assert_all_noise(db, far)
+class TestDtypes:
+    def test_float32_and_float64_address_same_points(self, db):
+        db.insert(_TRI_CLUSTER)
+        as_f64 = _TRI_CLUSTER.astype(np.float64)
+        assert_all_same_cluster(db, as_f64)
+        assert db.delete(as_f64[:1]) == [True]
+        assert_all_nan(db, _TRI_CLUSTER[:1])
+
+    def test_float64_input(self, db):
+        assert_one_cluster(db.insert_and_label(_TRI_CLUSTER.astype(np.float64)))
 
 
 # ---------------------------------------------------------------------------
@@ -115,26 +216,23 @@ class TestNoiseAndCreation:
 # ---------------------------------------------------------------------------
 
 class TestAbsorption:
-    def test_noise_absorbed_into_cluster(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        pts = np.array([[0.0, 0.0], [1.0, 0.0]])
-        db.insert(pts)
-        assert_all_noise(db, pts)
+    def test_noise_absorbed_into_cluster(self, db):
+        pts = _TWO_PTS
+        assert_noise(db.insert_and_label(pts))
 
-        trigger = np.array([[0.5, 0.5]])
+        trigger = _TRI_APEX
         db.insert(trigger)
         assert_all_same_cluster(db, np.vstack([pts, trigger]))
 
-    def test_border_point_absorbed(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        core = np.array([[0.0, 0.0], [0.5, 0.0], [0.0, 0.5]])
+    def test_border_point_absorbed(self, db):
+        core = _TIGHT_CORE
         db.insert(core)
 
-        border = np.array([[EPS, 0.0]])
+        border = _BORDER
         db.insert(border)
 
-        core_label = labels_of(db, core)[0]
-        border_label = labels_of(db, border)[0]
+        core_labs, border_labs = labels_of_many(db, core, border)
+        core_label, border_label = core_labs[0], border_labs[0]
         assert border_label == core_label or border_label == NOISE
 
 
@@ -143,17 +241,14 @@ class TestAbsorption:
 # ---------------------------------------------------------------------------
 
 class TestTwoClusters:
-    def test_two_separate_clusters(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        c1 = np.array([[0.0, 0.0], [1.0, 0.0], [0.5, 0.5]])
-        c2 = np.array([[10.0, 10.0], [11.0, 10.0], [10.5, 10.5]])
-        db.insert(c1)
-        db.insert(c2)
-
-        l1 = labels_of(db, c1)
-        l2 = labels_of(db, c2)
-        assert len(set(l1)) == 1 and l1[0] >= 0
-        assert len(set(l2)) == 1 and l2[0] >= 0
+    def test_two_separate_clusters(self, db):
+        c1 = _TRI_CLUSTER
+        c2 = _FAR_CLUSTER
+        db.insert(np.concatenate([c1, c2]))
+
+        l1, l2 = labels_of_many(db, c1, c2)
+        assert n_distinct(l1) == 1 and l1[0] >= 0
+        assert n_distinct(l2) == 1 and l2[0] >= 0
         assert l1[0] != l2[0]
 
 
@@ -162,21 +257,17 @@ class TestTwoClusters:
 # ---------------------------------------------------------------------------
 
 class TestMerge:
-    def test_bridge_merges_two_clusters(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        left = np.array([[-EPS, 0], [-EPS * 2, 0], [-EPS * 3, 0]])
-        right = np.array([[EPS, 0], [EPS * 2, 0], [EPS * 3, 0]])
-        db.insert(left)
-        db.insert(right)
+    def test_bridge_merges_two_clusters(self, db):
+        chains, bridge = _SPLIT_2WAY[:6], _SPLIT_2WAY[6:]
+        db.insert(chains)
 
-        l_before = labels_of(db, np.vstack([left, right]))
+        l_before = labels_of(db, chains)
         assert l_before[0] != l_before[3], "Clusters should be separate"
 
-        bridge = np.array([[0.0, 0.0]])
         db.insert(bridge)
 
-        l_after = labels_of(db, np.vstack([left, right]))
-        assert len(set(l_after)) == 1, f"Should be merged, got {l_after}"
+        l_after = labels_of(db, chains)
+        assert n_distinct(l_after) == 1, f"Should be merged, got {l_after}"
 
 
 # ---------------------------------------------------------------------------
@@ -184,22 +275,68 @@ class TestMerge:
 # ---------------------------------------------------------------------------
 
 class TestDuplicates:
-    def test_three_identical_points_form_cluster(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        p = np.array([[0.0, 0.0]])
-        db.insert(p)
-        db.insert(p)
-        db.insert(p)
+    def test_three_identical_points_form_cluster(self, db):
+        p = _P_ORIGIN
+        db.insert(p, weights=np.array([3], dtype=np.uint64))
         assert labels_of(db, p)[0] == 0
 
+    def test_weights_match_repeated_inserts(self):
+        weighted = IncrementalDBSCAN(eps=EPS, min_pts=4)
+        repeated = IncrementalDBSCAN(eps=EPS, min_pts=4)
+        weights = np.array([2, 1, 3], dtype=np.uint64)
+
+        weighted.insert(_TRI_CLUSTER, weights=weights)
+        for row, w in zip(_TRI_CLUSTER, weights):
+            for _ in range(int(w)):
+                repeated.insert(row[None, :])
+
+        assert are_lists_isomorphic(
+            labels_of(weighted, _TRI_CLUSTER), labels_of(repeated, _TRI_CLUSTER)
+        )
+
+    def test_weighted_point_deletes_one_copy_at_a_time(self, db):
+        p = _P_ORIGIN
+        db.insert(p, weights=np.array([2], dtype=np.uint64))
+        assert db.delete(p) == [True]
+        assert not np.isnan(labels_of(db, p)[0])
+        assert db.delete(p) == [True]
+        assert_all_nan(db, p)
+
+    @pytest.mark.parametrize(
+        "weights,exc",
+        [
+            (np.array([1, 1], dtype=np.uint64), ValueError),
+            (np.array([0, 1, 1], dtype=np.uint64), ValueError),
+            (np.array([2**32, 1, 1], dtype=np.uint64), OverflowError),
+        ],
+    )
+    def test_invalid_weights(self, db, weights, exc):
+        with pytest.raises(exc):
+            db.insert(_TRI_CLUSTER, weights=weights)
+        assert_all_nan(db, _TRI_CLUSTER)
+
+    def test_count_overflow_is_rejected(self, db):
+        db.insert(_P_ORIGIN, weights=np.array([2**32 - 1], dtype=np.uint64))
+        label = labels_of(db, _P_ORIGIN)[0]
+
+        with pytest.raises(OverflowError):
+            db.insert(_P_ORIGIN)
+        # A new neighbour would overflow the heavy point's neighbor_count
+        with pytest.raises(OverflowError):
+            db.insert(_TWO_PTS[1:])
+        assert labels_of(db, _P_ORIGIN)[0] == label
+        assert_all_nan(db, _TWO_PTS[1:])
+
+        assert db.delete(_P_ORIGIN) == [True]
+        assert labels_of(db, _P_ORIGIN)[0] == label
+
     def test_duplicate_increments_neighbor_count(self):
         db = IncrementalDBSCAN(eps=EPS, min_pts=4)
-        pts = np.array([[0.0, 0.0], [1.0, 0.0], [0.5, 0.5]])
-        db.insert(pts)
-        assert_all_noise(db, pts)
+        pts = _TRI_CLUSTER
+        assert_noise(db.insert_and_label(pts))
 
         # Fourth insert of an existing point should push it to min_pts
-        db.insert(np.array([[0.0, 0.0]]))
+        db.insert(_P_ORIGIN)
         lab = labels_of(db, pts)
         assert any(l >= 0 for l in lab), f"Expected some clustering, got {lab}"
 
@@ -209,32 +346,27 @@ class TestDuplicates:
 # ---------------------------------------------------------------------------
 
 class TestDeletion:
-    def test_delete_existing_returns_true(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        p = np.array([[0.0, 0.0]])
+    def test_delete_existing_returns_true(self, db):
+        p = _P_ORIGIN
         db.insert(p)
         result = db.delete(p)
         assert result == [True]
 
-    def test_delete_nonexistent_returns_false(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        result = db.delete(np.array([[99.0, 99.0]]))
+    def test_delete_nonexistent_returns_false(self, db):
+        result = db.delete(_MISSING)
         assert result == [False]
 
-    def test_deleted_point_becomes_nan(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        p = np.array([[0.0, 0.0]])
+    def test_deleted_point_becomes_nan(self, db):
+        p = _P_ORIGIN
         db.insert(p)
         db.delete(p)
         assert_all_nan(db, p)
 
-    def test_unknown_point_is_nan(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        assert_all_nan(db, np.array([[42.0, 42.0]]))
+    def test_unknown_point_is_nan(self, db):
+        assert_all_nan(db, _MISSING)
 
-    def test_delete_duplicate_decrements(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        p = np.array([[0.0, 0.0]])
+    def test_delete_duplicate_decrements(self, db):
+        p = _P_ORIGIN
         db.insert(p)
         db.insert(p)
         db.insert(p)
@@ -249,59 +381,53 @@ class TestDeletion:
         db.delete(p)  # count 1 -> 0, fully removed
         assert_all_nan(db, p)
 
+    def test_delete_by_ids_matches_delete(self, db):
+        pts = np.concatenate([_TRI_CLUSTER, _P_ORIGIN])
+        ids = db.insert(pts)
+        assert ids.dtype == np.uint64 and ids.shape == (4,)
+        assert ids[0] == ids[3], "Identical rows should share an id"
+
+        assert db.delete_by_ids(ids[[0, 3]]) == [True, True]
+        assert_all_nan(db, _P_ORIGIN)
+        assert db.delete_by_ids(ids[[0]]) == [False]
+        assert_noise(labels_of(db, pts[1:3]))
+
 
 # ---------------------------------------------------------------------------
 # Deletion: splits
 # ---------------------------------------------------------------------------
 
 class TestSplit:
-    def test_two_way_split(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        left = np.array([[-EPS, 0], [-EPS * 2, 0], [-EPS * 3, 0]])
-        right = np.array([[EPS, 0], [EPS * 2, 0], [EPS * 3, 0]])
-        bridge = np.array([[0.0, 0.0]])
-
-        db.insert(left)
-        db.insert(right)
-        db.insert(bridge)
-
-        all_pts = np.vstack([left, right, bridge])
-        assert len(set(labels_of(db, all_pts))) == 1, "Should be one cluster"
-
-        db.delete(bridge)
-        labs = labels_of(db, np.vstack([left, right]))
-
-        left_labs = set(labs[:3])
-        right_labs = set(labs[3:])
-        assert len(left_labs) == 1, f"Left not uniform: {labs[:3]}"
-        assert len(right_labs) == 1, f"Right not uniform: {labs[3:]}"
-        assert left_labs != right_labs, "Left and right should be different clusters"
+    def test_two_way_split(self, db):
+        all_pts = _SPLIT_2WAY
+        db.insert(all_pts)
+        assert n_distinct(labels_of(db, all_pts)) == 1, "Should be one cluster"
+
+        db.delete(all_pts[6:])
+        labs = labels_of(db, all_pts)
+        left_labs, right_labs, bridge_labs = labs[:3], labs[3:6], labs[6:]
+
+        assert n_distinct(left_labs) == 1, f"Left not uniform: {left_labs}"
+        assert n_distinct(right_labs) == 1, f"Right not uniform: {right_labs}"
+        assert label_mask(left_labs) != label_mask(right_labs), (
+            "Left and right should be different clusters"
+        )
+        assert np.all(np.isnan(bridge_labs)), f"Bridge should be gone, got {bridge_labs}"
 
-    def test_three_way_split(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        left = np.array([[-EPS, 0], [-EPS * 2, 0], [-EPS * 3, 0]])
-        top = np.array([[0, EPS], [0, EPS * 2], [0, EPS * 3]])
-        bottom = np.array([[0, -EPS], [0, -EPS * 2], [0, -EPS * 3]])
-        bridge = np.array([[0.0, 0.0]])
-
-        db.insert(left)
-        db.insert(top)
-        db.insert(bottom)
-        db.insert(bridge)
+    def test_three_way_split(self, db):
+        all_pts = _SPLIT_3WAY
+        db.insert(all_pts)
 
-        db.delete(bridge)
-        labs = labels_of(db, np.vstack([left, top, bottom]))
+        db.delete(all_pts[9:])
+        labs = labels_of(db, all_pts[:9])
 
-        left_labs = set(labs[:3])
-        top_labs = set(labs[3:6])
-        bottom_labs = set(labs[6:])
-        all_unique = {labs[0], labs[3], labs[6]}
+        heads = labs[[0, 3, 6]]
 
-        assert len(left_labs) == 1
-        assert len(top_labs) == 1
-        assert len(bottom_labs) == 1
-        assert len(all_unique) == 3, f"Expected 3 clusters, got {all_unique}"
-        assert NOISE not in all_unique
+        assert n_distinct(labs[:3]) == 1
+        assert n_distinct(labs[3:6]) == 1
+        assert n_distinct(labs[6:]) == 1
+        assert n_distinct(heads) == 3, f"Expected 3 clusters, got {heads}"
+        assert not label_mask(heads) & 1, f"Unexpected noise in {heads}"
 
 
 # ---------------------------------------------------------------------------
@@ -309,16 +435,24 @@ class TestSplit:
 # ---------------------------------------------------------------------------
 
 class TestReinsert:
-    def test_delete_then_reinsert(self):
-        db = IncrementalDBSCAN(eps=EPS, min_pts=3)
-        pts = np.array([[0.0, 0.0], [1.0, 0.0], [0.5, 0.5]])
-        db.insert(pts)
-        assert_all_same_cluster(db, pts)
+    def test_delete_then_reinsert(self, db):
+        pts = _TRI_CLUSTER
+        assert_one_cluster(db.insert_and_label(pts))
 
-        db.delete(np.array([[0.5, 0.5]]))
-        db.insert(np.array([[0.5, 0.5]]))
+        db.delete(_TRI_APEX)
+        db.insert(_TRI_APEX)
         assert_all_same_cluster(db, pts)
 
+    def test_reset_forgets_points_and_labels(self, db):
+        db.insert(_FAR_CLUSTER)
+        db.reset()
+        assert_all_nan(db, _FAR_CLUSTER)
+        assert not any(db.delete(_FAR_CLUSTER))
+
+        labs = db.insert_and_label(_TRI_CLUSTER)
+        assert_one_cluster(labs)
+        assert labs[0] == 0
+
 
 # ---------------------------------------------------------------------------
 # Multi-dimensional
@@ -329,9 +463,8 @@ class TestMultiDimensional:
     def test_various_dimensions(self, n_dims):
         rng = np.random.RandomState(42)
         db = IncrementalDBSCAN(eps=3.0, min_pts=3)
-        pts = rng.randn(20, n_dims) * 0.5
-        db.insert(pts)
-        labs = labels_of(db, pts)
+        pts = (rng.randn(20, n_dims) * 0.5).astype(np.float32)
+        labs = db.insert_and_label(pts)
         assert not np.any(np.isnan(labs)), f"No NaN expected in {n_dims}D"
 
 
@@ -342,28 +475,80 @@ class TestMultiDimensional:
 class TestDistanceMetrics:
     def test_manhattan_distance(self):
         db = IncrementalDBSCAN(eps=2.0, min_pts=3, p=1.0)
-        pts = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
-        db.insert(pts)
-        labs = labels_of(db, pts)
+        labs = db.insert_and_label(_L_SHAPE)
         assert np.all(labs == labs[0]) and labs[0] >= 0
 
     def test_chebyshev_distance(self):
         db = IncrementalDBSCAN(eps=1.5, min_pts=3, p=float("inf"))
-        pts = np.array([[0.0, 0.0], [1.0, 1.0], [0.5, 0.5]])
-        db.insert(pts)
-        labs = labels_of(db, pts)
+        labs = db.insert_and_label(_DIAGONAL)
         assert np.all(labs == labs[0]) and labs[0] >= 0
 
 
 # ---------------------------------------------------------------------------
-# Cross-validation with sklearn DBSCAN
+# Cross-validation with a reference batch DBSCAN
 # ---------------------------------------------------------------------------
 
-class TestSklearnCrossValidation:
-    @pytest.fixture(autouse=True)
-    def _skip_if_no_sklearn(self):
-        pytest.importorskip("sklearn")
-
+def make_blobs(n_samples, n_centers, cluster_std=0.5, seed=42):
+    """Isotropic 2D Gaussian blobs; same draws as sklearn's make_blobs."""
+    rng = np.random.RandomState(seed)
+    centers = rng.uniform(-10.0, 10.0, size=(n_centers, 2))
+    sizes = [n_samples // n_centers] * n_centers
+    for i in range(n_samples % n_centers):
+        sizes[i] += 1
+    X = np.concatenate(
+        [rng.normal(loc=c, scale=cluster_std, size=(n, 2)) for c, n in zip(centers, sizes)]
+    )
+    order = np.arange(n_samples)
+    rng.shuffle(order)
+    return X[order]
+
+
+def reference_dbscan(X, eps, min_pts):
+    """Plain batch DBSCAN over a dense distance matrix.
+
+    Neighborhoods are closed (distance <= eps) and include the point itself,
+    as in the incremental implementation. Border points join the first
+    cluster that reaches them. Distances are computed in float64, as in the
+    Rust engine.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    diff = X[:, None, :] - X[None, :, :]
+    adjacency = np.einsum("ijk,ijk->ij", diff, diff) <= eps * eps
+    is_core = adjacency.sum(axis=1) >= min_pts
+
+    labels = np.full(len(X), NOISE, dtype=np.int64)
+    next_label = 0
+    for start in np.flatnonzero(is_core):
+        if labels[start] != NOISE:
+            continue
+        labels[start] = next_label
+        stack = [start]
+        while stack:
+            i = stack.pop()
+            reached = np.flatnonzero(adjacency[i] & (labels == NOISE))
+            labels[reached] = next_label
+            stack.extend(reached[is_core[reached]])
+        next_label += 1
+    return labels
+
+
+@pytest.fixture(scope="session")
+def blob_cache():
+    """(n_samples, n_centers) -> X, shared across parametrized cases.
+
+    Under pytest-xdist each worker gets its own session, so the cache is
+    never shared between processes.
+    """
+    return {}
+
+
+@pytest.fixture(scope="session")
+def reference_label_cache():
+    """(n_samples, n_centers, eps, min_pts) -> reference DBSCAN labels."""
+    return {}
+
+
+class TestReferenceCrossValidation:
     @pytest.mark.parametrize(
         "n_samples,n_centers,eps,min_pts",
         [
@@ -373,26 +558,25 @@ class TestSklearnCrossValidation:
             (200, 5, 2.0, 5),
         ],
     )
-    def test_matches_sklearn(self, n_samples, n_centers, eps, min_pts):
-        from sklearn.cluster import DBSCAN
-        from sklearn.datasets import make_blobs
-
-        X, _ = make_blobs(
-            n_samples=n_samples,
-            centers=n_centers,
-            n_features=2,
-            cluster_std=0.5,
-            random_state=42,
-        )
+    def test_matches_reference(
+        self, n_samples, n_centers, eps, min_pts, blob_cache, reference_label_cache
+    ):
+        key = (n_samples, n_centers)
+        if key not in blob_cache:
+            blob_cache[key] = make_blobs(n_samples, n_centers).astype(np.float32)
+        X = blob_cache[key]
+
+        label_key = key + (eps, min_pts)
+        if label_key not in reference_label_cache:
+            reference_label_cache[label_key] = reference_dbscan(X, eps, min_pts)
+        reference_labels = reference_label_cache[label_key]
 
         rust_db = IncrementalDBSCAN(eps=eps, min_pts=min_pts)
-        rust_db.insert(X)
-        rust_labels = [int(l) for l in rust_db.get_cluster_labels(X)]
-
-        sklearn_labels = list(DBSCAN(eps=eps, min_samples=min_pts).fit_predict(X))
+        rust_labels = [int(l) for l in rust_db.insert_and_label(X)]
 
-        assert are_lists_isomorphic(rust_labels, sklearn_labels), (
-            f"Labels mismatch: rust={rust_labels[:10]}... sklearn={sklearn_labels[:10]}..."
+        assert are_lists_isomorphic(rust_labels, reference_labels), (
+            f"Labels mismatch: rust={rust_labels[:10]}... "
+            f"reference={list(reference_labels[:10])}..."
         )
 
 
@@ -407,12 +591,35 @@ class TestStress:
         db = IncrementalDBSCAN(eps=2.0, min_pts=5)
 
         for _ in range(5):
-            batch = rng.randn(200, 2) * 10
-            db.insert(batch)
-            db.delete(batch[:40])
+            batch = (rng.randn(200, 2) * 10).astype(np.float32)
+            ids = db.insert(batch)
+            db.delete_by_ids(ids[:40])
 
-        remaining = rng.randn(50, 2) * 10
-        db.insert(remaining)
-        labs = labels_of(db, remaining)
+        remaining = (rng.randn(50, 2) * 10).astype(np.float32)
+        labs = db.insert_and_label(remaining)
         assert len(labs) == 50
         assert not np.any(np.isnan(labs))
+
+    def test_mass_delete_matches_reference(self):
+        """Deleting two thirds of the points forces spatial index compaction;
+        the surviving clustering must still match a batch DBSCAN over them.
+        """
+        eps, min_pts = 0.5, 5
+        X = make_blobs(600, 4, seed=7).astype(np.float32)
+        db = IncrementalDBSCAN(eps=eps, min_pts=min_pts)
+        ids = db.insert(X)
+
+        order = np.random.RandomState(7).permutation(len(X))
+        db.delete_by_ids(ids[order[:400]])
+        survivors = X[order[400:]]
+
+        labs = db.get_cluster_labels(survivors)
+        reference = reference_dbscan(survivors, eps, min_pts)
+        assert not np.any(np.isnan(labs))
+        np.testing.assert_array_equal(labs == NOISE, reference == NOISE)
+
+        # Border points may join either neighbouring cluster; cores may not
+        diff = survivors[:, None, :].astype(np.float64) - survivors[None, :, :]
+        is_core = (np.einsum("ijk,ijk->ij", diff, diff) <= eps * eps).sum(axis=1) >= min_pts
+        assert is_core.any()
+        assert are_lists_isomorphic(labs[is_core], reference[is_core])